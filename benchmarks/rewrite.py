@@ -0,0 +1,80 @@
+import argparse
+import base64
+import os
+import sys
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from rewrite import rewriters  # noqa: E402
+
+
+def synthetic_svg(shapes: int, images: int) -> str:
+    body = []
+    for i in range(shapes):
+        body.append(f'<g transform="translate({i} {i})"><path d="M0 0L{i} 10Z" fill="#{i % 256:02x}0000"/>')
+        body.append(f'<text x="{i}" y="20">slide &amp; text {i}</text></g>')
+    for i in range(images):
+        body.append(f'<image width="10" height="10" xlink:href="https://example.com/img/{i}.png?a=1&amp;b=2"/>')
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" viewBox="0 0 960 540">'
+        + "".join(body)
+        + "</svg>"
+    )
+
+
+def malformed_svgs() -> dict[str, str]:
+    head = '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">'
+    return {
+        "entity": f'{head}<text>a&nbsp;b</text><image xlink:href="https://example.com/a.png"/></svg>',
+        "raw amp": f'{head}<image xlink:href="https://example.com/a.png?a=1&b=2"/></svg>',
+        "unclosed": f'{head}<g><image xlink:href="https://example.com/a.png"/>',
+    }
+
+
+def canonical(svg: str) -> bytes:
+    return etree.tostring(etree.fromstring(svg.encode("utf-8"), etree.XMLParser(recover=True)), method="c14n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare SVG image href rewriters")
+    parser.add_argument("--shapes", type=int, default=2000)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--image-size", type=int, default=64 * 1024)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    svg = synthetic_svg(args.shapes, args.images)
+    payload = "data:image/png;base64," + base64.b64encode(b"\x89PNG" + b"\0" * args.image_size).decode("utf-8")
+    outputs = {}
+
+    for name, rewrite in rewriters.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            outputs[name] = rewrite(svg, lambda href: payload)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{name:>5}: {elapsed * 1000:8.2f} ms/svg  {len(outputs[name]):>10} chars")
+
+    reference = canonical(outputs["bs4"])
+    for name, output in outputs.items():
+        print(f"{name:>5}: {'equivalent' if canonical(output) == reference else 'DIFFERENT'}")
+
+    for case, svg in malformed_svgs().items():
+        results = {}
+        for name, rewrite in rewriters.items():
+            try:
+                results[name] = canonical(rewrite(svg, lambda href: payload))
+            except Exception as e:
+                results[name] = e
+        for name, result in results.items():
+            if isinstance(result, Exception):
+                verdict = f"FAILED ({result!r})"
+            else:
+                verdict = "equivalent" if result == results["bs4"] else "DIFFERENT"
+            print(f"{name:>5}: {case}: {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import hashlib
+import random
+import sys
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+KINDS = ("png", "jpg", "svg")
+
+
+def image(kind: str, number: int, size: int) -> bytes:
+    body = random.Random(f"{kind}-{number}").randbytes(size)
+    if kind == "png":
+        return b"\x89PNG\r\n\x1a\n" + body
+    if kind == "jpg":
+        return b"\xff\xd8\xff\xe0" + body
+    rects = "".join(f'<rect x="{b % 100}" y="{b // 3}" width="5" height="5"/>' for b in body[: size // 40])
+    return f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100">{rects}</svg>'.encode("utf-8")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    images: dict[str, bytes] = {}
+    lock = threading.Lock()
+    requests = 0
+
+    def do_GET(self) -> None:
+        if self.path == "/requests":
+            self.send(str(self.requests).encode("utf-8"))
+            return
+        with self.lock:
+            type(self).requests += 1
+        try:
+            _, kind, number, size = self.path.split("/")
+            key = self.path
+            if key not in self.images:
+                self.images[key] = image(kind, int(number), int(size))
+            content = self.images[key]
+        except ValueError:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send(content, etag)
+
+    def send(self, content: bytes, etag: str | None = None) -> None:
+        self.send_response(200)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def serve() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@dataclass
+class Deck:
+    base: str
+    slides: int = 2
+    svgs: int = 20
+    images: int = 4
+    unique: int = 40
+    small: int = 16 * 1024
+    large: int = 1024 * 1024
+    large_ratio: float = 0.05
+    shapes: int = 200
+    seed: int = 0
+
+    def hrefs(self, rng: random.Random) -> list[str]:
+        hrefs = []
+        for _ in range(self.images):
+            number = rng.randrange(self.unique)
+            kind = KINDS[number % len(KINDS)]
+            size = self.large if number < self.unique * self.large_ratio else self.small
+            hrefs.append(f"{self.base}/{kind}/{number}/{size}")
+        return hrefs
+
+    def svg(self, rng: random.Random) -> str:
+        shapes = "".join(
+            f'<path d="M{rng.randrange(960)} {rng.randrange(540)}l10 10" stroke="#333"/>' for _ in range(self.shapes)
+        )
+        images = "".join(f'<image width="100" height="100" xlink:href="{href}"/>' for href in self.hrefs(rng))
+        return (
+            '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'viewBox="0 0 960 540">{shapes}{images}</svg>'
+        )
+
+    def build(self, number: int) -> list[list[str]]:
+        rng = random.Random(f"{self.seed}-{number}")
+        return [[self.svg(rng) for _ in range(self.svgs)] for _ in range(self.slides)]
+
+
+@dataclass
+class BenchPage:
+    name: str
+    prefix: str
+    deck: list[list[str]]
+    course: str = "Bench Course"
+    group: str = "Bench Group"
+    lecture: str = "Bench Lecture"
+
+    @property
+    def slides(self) -> list[list[str]]:
+        return self.deck
+
+    def slides2svg(self):
+        yield from self.deck
+
+
+@dataclass
+class BenchLecture:
+    name: str
+    group: str
+    children: list[BenchPage] = field(default_factory=list)
+
+    def pages(self) -> list[BenchPage]:
+        return self.children
+
+
+def lectures(deck: Deck, count: int, pages: int) -> list[BenchLecture]:
+    result = []
+    for i in range(count):
+        lecture = BenchLecture(f"Lecture {i}", "Bench Group")
+        for j in range(pages):
+            number = i * pages + j
+            page = BenchPage(f"Page {j}", f"/courses/1/bench/lecture-{i}/{j:02}", deck.build(number))
+            page.lecture = lecture.name
+            lecture.children.append(page)
+        result.append(lecture)
+    return result
+
+
+if __name__ == "__main__":
+    server = serve()
+    print(server.server_address[1], flush=True)
+    sys.stdin.read()
+    server.shutdown()
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from standin import Deck, lectures  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Timings:
+    stages = {"fetch": "fetch_img", "parse": "process", "encode": "embed", "render": "render"}
+
+    def __init__(self) -> None:
+        self.totals = defaultdict(float)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def wrap(self, stage: str, func):
+        def wrapper(*args, **kwargs):
+            stack = self.local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.lock:
+                    self.totals[stage] += elapsed - nested
+
+        return wrapper
+
+    def install(self, cls) -> None:
+        for stage, name in self.stages.items():
+            setattr(cls, name, self.wrap(stage, getattr(cls, name)))
+
+
+def peak_rss() -> int | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def requests_served(base: str) -> int:
+    with urllib.request.urlopen(f"{base}/requests") as response:
+        return int(response.read())
+
+
+def written(out: str) -> int:
+    total = 0
+    for root, dirs, files in os.walk(out):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def run(args: argparse.Namespace, targets: list, out: str) -> None:
+    from assets import AssetStore
+    from cache import ImageCache
+    from pipeline import Pipeline, RateLimiter
+    from utils import DLSlides
+
+    options = {"parser": args.parser}
+    if args.cache:
+        options["cache"] = ImageCache(os.path.join(out, ".cache"))
+    if args.assets:
+        options["assets"] = AssetStore(os.path.join(out, "assets"))
+    pages = [page for lecture in targets for page in lecture.pages()]
+
+    if args.backend == "serial":
+        for page in pages:
+            DLSlides(page, out, **options)
+    elif args.backend == "pipeline":
+        options.pop("parser")
+        limiter = RateLimiter(rate=1e9, burst=1 << 30)
+        errors = Pipeline(out, limiter=limiter, log=lambda message: None, **options).run(targets)
+        if errors:
+            raise errors[0][1]
+    else:
+        from async_dl import download_many
+
+        results = asyncio.run(download_many(pages, out, **options))
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+
+def measure(args: argparse.Namespace) -> None:
+    deck = Deck(args.base, args.slides, args.svgs, args.images, args.unique, args.small, args.large)
+    targets = lectures(deck, args.lectures, args.pages)
+    pages = sum(len(lecture.pages()) for lecture in targets)
+    images = pages * args.slides * args.svgs * args.images
+
+    from utils import DLSlides
+
+    timings = Timings()
+    timings.install(DLSlides)
+
+    served = requests_served(args.base)
+    start = time.perf_counter()
+    run(args, targets, args.out)
+    elapsed = time.perf_counter() - start
+    served = requests_served(args.base) - served
+    rss = peak_rss()
+    print(f"run {args.run} ({args.backend}, {args.parser}{', cache' if args.cache else ''})")
+    print(f"  wall        {elapsed:10.2f} s")
+    print(f"  pages/sec   {pages / elapsed:10.2f}")
+    print(f"  images/sec  {images / elapsed:10.2f}  ({images} references, {served} requests)")
+    print(f"  written     {written(args.out) / 1024 / 1024:10.2f} MiB")
+    print(f"  peak RSS    {rss / 1024 / 1024:10.2f} MiB" if rss else "  peak RSS           n/a")
+    for stage in Timings.stages:
+        print(f"  {stage:<11} {timings.totals[stage]:10.2f} s (summed over threads)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure DLSlides throughput against a local stand-in server")
+    parser.add_argument("--backend", choices=["serial", "pipeline", "async"], default="pipeline")
+    parser.add_argument("--parser", choices=["bs4", "lxml"], default="lxml")
+    parser.add_argument("--lectures", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--slides", type=int, default=2)
+    parser.add_argument("--svgs", type=int, default=20)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--unique", type=int, default=40)
+    parser.add_argument("--small", type=int, default=16 * 1024)
+    parser.add_argument("--large", type=int, default=1024 * 1024)
+    parser.add_argument("--runs", type=int, default=2, help="repeat into the same output to measure warm re-runs")
+    parser.add_argument("--cache", action="store_true", help="use the persistent image cache")
+    parser.add_argument("--assets", action="store_true", help="write shared assets instead of data URIs")
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    parser.add_argument("--run", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.base is not None:
+        measure(args)
+        return
+
+    standin = os.path.join(os.path.dirname(os.path.abspath(__file__)), "standin.py")
+    server = subprocess.Popen([sys.executable, standin], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        base = f"http://127.0.0.1:{int(server.stdout.readline())}"
+        with tempfile.TemporaryDirectory() as out:
+            for i in range(args.runs):
+                command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:]]
+                subprocess.run(command + ["--base", base, "--out", out, "--run", str(i + 1)], check=True)
+    finally:
+        server.stdin.close()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
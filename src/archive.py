@@ -0,0 +1,150 @@
+import mmap
+import os
+import shutil
+import struct
+import threading
+import warnings
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import Callable
+
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+
+def split(root: str, path: str) -> tuple[str, str]:
+    course, _, name = os.path.relpath(path, root).replace(os.sep, "/").partition("/")
+    return course, name
+
+
+def inflate(data, start: int, size: int) -> bytes | None:
+    decompressor = zlib.decompressobj(-15)
+    content = decompressor.decompress(data[start : start + size])
+    return content if decompressor.eof else None
+
+
+def salvage(path: str) -> int:
+    latest = {}
+    temp = f"{path}.tmp"
+    with open(path, "rb") as f, zipfile.ZipFile(temp, "w", zipfile.ZIP_DEFLATED) as out:
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                offset = 0
+                while data[offset : offset + 4] == b"PK\x03\x04" and offset + LOCAL_HEADER.size <= len(data):
+                    _, _, flags, method, _, _, crc, size, _, name_size, extra = LOCAL_HEADER.unpack_from(data, offset)
+                    name = data[offset + LOCAL_HEADER.size : offset + LOCAL_HEADER.size + name_size]
+                    start = offset + LOCAL_HEADER.size + name_size + extra
+                    if method != zipfile.ZIP_DEFLATED or flags & 0x08 or start + size > len(data):
+                        break
+                    content = inflate(data, start, size)
+                    if content is None or zlib.crc32(content) != crc:
+                        break
+                    latest[name.decode("utf-8" if flags & 0x800 else "cp437")] = (start, size)
+                    offset = start + size
+                for name, (start, size) in latest.items():
+                    out.writestr(name, inflate(data, start, size))
+    os.replace(temp, path)
+    return len(latest)
+
+
+@dataclass
+class ZipOutput:
+    root: str
+    compresslevel: int = 6
+    every: int = 20
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.names: dict[str, set[str]] = {}
+        self.writers: dict[str, zipfile.ZipFile] = {}
+        self.superseded: set[str] = set()
+        self.callbacks: list[Callable[[], None]] = []
+        self.commits = 0
+
+    def path(self, course: str) -> str:
+        return os.path.join(self.root, f"{course}.zip")
+
+    def entries(self, course: str) -> set[str]:
+        if course not in self.names:
+            try:
+                with zipfile.ZipFile(self.path(course)) as zf:
+                    self.names[course] = set(zf.namelist())
+            except FileNotFoundError:
+                self.names[course] = set()
+            except zipfile.BadZipFile:
+                salvage(self.path(course))
+                with zipfile.ZipFile(self.path(course)) as zf:
+                    self.names[course] = set(zf.namelist())
+        return self.names[course]
+
+    def writer(self, course: str) -> zipfile.ZipFile:
+        if course not in self.writers:
+            self.writers[course] = zipfile.ZipFile(
+                self.path(course), "a", zipfile.ZIP_DEFLATED, compresslevel=self.compresslevel
+            )
+        return self.writers[course]
+
+    def exists(self, path: str) -> bool:
+        course, name = split(self.root, path)
+        with self.lock:
+            return name in self.entries(course)
+
+    def read(self, path: str) -> bytes:
+        course, name = split(self.root, path)
+        with self.lock:
+            if course in self.writers:
+                self.writers.pop(course).close()
+            with zipfile.ZipFile(self.path(course)) as zf:
+                return zf.read(name)
+
+    def commit(self, temp: str, path: str) -> str:
+        course, name = split(self.root, path)
+        with self.lock:
+            entries = self.entries(course)
+            if name in entries:
+                self.superseded.add(course)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                self.writer(course).write(temp, name)
+            entries.add(name)
+            self.commits += 1
+            due = self.commits % self.every == 0
+        os.remove(temp)
+        if due:
+            self.checkpoint()
+        return path
+
+    def after(self, callback: Callable[[], None]) -> None:
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def checkpoint(self) -> None:
+        with self.lock:
+            for zf in self.writers.values():
+                zf.close()
+            self.writers.clear()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def close(self) -> None:
+        self.checkpoint()
+        with self.lock:
+            courses, self.superseded = self.superseded, set()
+            for course in courses:
+                compact(self.path(course))
+
+
+def compact(path: str) -> int:
+    with zipfile.ZipFile(path) as zf:
+        infos = zf.infolist()
+        latest = {info.filename: info for info in infos}
+        if len(latest) == len(infos):
+            return 0
+        temp = f"{path}.tmp"
+        with zipfile.ZipFile(temp, "w", zipfile.ZIP_DEFLATED) as out:
+            for info in latest.values():
+                with zf.open(info) as src, out.open(info, "w") as dst:
+                    shutil.copyfileobj(src, dst)
+    os.replace(temp, path)
+    return len(infos) - len(latest)
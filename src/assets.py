@@ -0,0 +1,62 @@
+import hashlib
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+
+from cache import ImageCache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FICLONE = 0x40049409
+
+
+def reflink(src: str, dst: str) -> None:
+    if fcntl is None:
+        raise OSError("reflink is not supported on this platform")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+
+
+def link(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        reflink(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+@dataclass
+class AssetStore:
+    root: str
+
+    def __post_init__(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, content: bytes, extension: str, origin: ImageCache | None = None) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.root, f"{digest}.{extension}")
+        if os.path.exists(path):
+            return path
+
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        source = origin.blob(digest) if origin is not None else None
+        if source is not None and os.path.exists(source):
+            link(source, temp)
+        else:
+            with open(temp, "wb") as f:
+                f.write(content)
+        os.replace(temp, path)
+        return path
@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+import requests
+from iniad import Page
+
+from session import create_session
+from utils import DLSlides
+
+
+@dataclass
+class Engine:
+    out: str
+    concurrency: int = 64
+    page_concurrency: int = 4
+    options: dict = field(default_factory=dict)
+    session: requests.Session | None = None
+
+    def __post_init__(self) -> None:
+        if self.session is None:
+            self.session = self.options.get("session") or create_session(per_host=self.concurrency)
+        self.options = {**self.options, "session": self.session}
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.pages = asyncio.Semaphore(self.page_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.rewriters = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    async def call(self, func: Callable, *args):
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def page(self, page: Page) -> list[str]:
+        async with self.pages:
+            dl = DLSlides(page, self.out, executor=self.rewriters, lazy=True, **self.options)
+            if not await self.call(dl.fetch):
+                return []
+            return await self.call(dl.render, dl.inline())
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.rewriters.shutdown(wait=False, cancel_futures=True)
+        cache = self.options.get("cache")
+        if cache is not None:
+            cache.save()
+
+
+async def download_page(page: Page, out: str, concurrency: int = 64, **options) -> list[str]:
+    engine = Engine(out, concurrency, options=options)
+    try:
+        return await engine.page(page)
+    finally:
+        engine.close()
+
+
+async def download_many(
+    pages: Iterable[Page], out: str, concurrency: int = 64, page_concurrency: int = 4, **options
+) -> list[list[str] | BaseException]:
+    engine = Engine(out, concurrency, page_concurrency, options)
+    try:
+        return await asyncio.gather(*(engine.page(page) for page in pages), return_exceptions=True)
+    finally:
+        engine.close()
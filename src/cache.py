@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass
+class CacheEntry:
+    digest: str
+    size: int
+    etag: str | None = None
+    last_modified: str | None = None
+    fetched: float = 0.0
+
+
+@dataclass
+class ImageCache:
+    root: str
+    max_bytes: int = 1024 * 1024 * 1024
+    max_age: float = 24 * 60 * 60
+    entries: dict[str, CacheEntry] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.lock = threading.RLock()
+        self.guards: dict[str, threading.Lock] = {}
+        self.index = os.path.join(self.root, "index.json")
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        try:
+            with open(self.index, encoding="UTF-8") as f:
+                data = json.load(f)
+            self.entries = {url: CacheEntry(**entry) for url, entry in data.items()}
+        except (OSError, ValueError, TypeError):
+            self.entries = {}
+
+    def blob(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def size(self) -> int:
+        return sum({entry.digest: entry.size for entry in self.entries.values()}.values())
+
+    def guard(self, url: str) -> threading.Lock:
+        with self.lock:
+            return self.guards.setdefault(url, threading.Lock())
+
+    def get(self, url: str) -> CacheEntry | None:
+        with self.lock:
+            entry = self.entries.pop(url, None)
+            if entry is not None:
+                self.entries[url] = entry
+            return entry
+
+    def fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched < self.max_age
+
+    def headers(self, entry: CacheEntry | None) -> dict[str, str]:
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def read(self, url: str) -> bytes | None:
+        entry = self.get(url)
+        if entry is None:
+            return None
+        try:
+            with open(self.blob(entry.digest), "rb") as f:
+                return f.read()
+        except OSError:
+            with self.lock:
+                self.entries.pop(url, None)
+            return None
+
+    def put(self, url: str, content: bytes, headers=None) -> CacheEntry:
+        headers = headers or {}
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp, "wb") as f:
+                f.write(content)
+            os.replace(temp, path)
+        entry = CacheEntry(digest, len(content), headers.get("ETag"), headers.get("Last-Modified"), time.time())
+        with self.lock:
+            self.entries.pop(url, None)
+            self.entries[url] = entry
+            self.evict()
+        return entry
+
+    def refresh(self, url: str, headers=None) -> None:
+        headers = headers or {}
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return
+            entry.fetched = time.time()
+            entry.etag = headers.get("ETag", entry.etag)
+            entry.last_modified = headers.get("Last-Modified", entry.last_modified)
+
+    def evict(self) -> None:
+        with self.lock:
+            total = self.size()
+            while total > self.max_bytes and len(self.entries) > 1:
+                url = next(iter(self.entries))
+                entry = self.entries.pop(url)
+                if all(other.digest != entry.digest for other in self.entries.values()):
+                    total -= entry.size
+                    try:
+                        os.remove(self.blob(entry.digest))
+                    except OSError:
+                        pass
+
+    def save(self) -> None:
+        with self.lock:
+            data = {url: asdict(entry) for url, entry in self.entries.items()}
+            temp = f"{self.index}.tmp"
+            with open(temp, "w", encoding="UTF-8") as f:
+                json.dump(data, f)
+            os.replace(temp, self.index)
@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from iniad import Course, Lecture, Moocs, Page
+
+default_path = os.path.join(os.path.expanduser("~"), ".moocs-slide-dl", "catalog.json")
+
+
+@dataclass
+class Catalog:
+    moocs: Moocs
+    path: str = default_path
+    ttl: float = 6 * 60 * 60
+    throttle: Callable[[], None] | None = None
+
+    def __post_init__(self) -> None:
+        self.lock = threading.RLock()
+        self.live_courses: dict[str, Course] | None = None
+        self.live_lectures: dict[str, dict[str, dict[str, Lecture]]] = {}
+        self.live_pages: dict[tuple[str, str, str], dict[str, Page]] = {}
+        try:
+            with open(self.path, encoding="UTF-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def fresh(self, node: dict | None) -> bool:
+        return node is not None and time.time() - node.get("updated", 0) < self.ttl
+
+    def node(self, *keys: str) -> dict | None:
+        node = self.data
+        for key in keys:
+            node = node.get("children", {}).get(key)
+            if node is None:
+                return None
+        return node
+
+    def cached(self, *keys: str) -> list[str] | None:
+        node = self.node(*keys)
+        if node is None or "children" not in node:
+            return None
+        return [name for name, child in node["children"].items() if child.get("slides", 1) > 0]
+
+    def stale(self, *keys: str) -> bool:
+        return not self.fresh(self.node(*keys))
+
+    def wait(self) -> None:
+        if self.throttle is not None:
+            self.throttle()
+
+    def record(self, keys: tuple[str, ...], children: dict[str, dict]) -> None:
+        with self.lock:
+            node = self.data
+            for key in keys:
+                node = node.setdefault("children", {}).setdefault(key, {})
+            previous = node.get("children", {})
+            node["children"] = {name: {**previous.get(name, {}), **child} for name, child in children.items()}
+            node["updated"] = time.time()
+
+    def courses(self) -> dict[str, Course]:
+        if self.live_courses is None or self.stale():
+            self.wait()
+            courses = {course.name: course for course in self.moocs.courses()}
+            with self.lock:
+                self.live_courses = courses
+                self.record((), {name: {} for name in courses})
+                self.save()
+        return self.live_courses
+
+    def lectures(self, course: Course) -> dict[str, dict[str, Lecture]]:
+        if course.name not in self.live_lectures or self.stale(course.name):
+            self.wait()
+            groups = {}
+            for lecture in course.lectures():
+                groups.setdefault(lecture.group, {})[lecture.name] = lecture
+            with self.lock:
+                self.live_lectures[course.name] = groups
+                self.record((course.name,), {group: {} for group in groups})
+                for group, lectures in groups.items():
+                    self.record((course.name, group), {name: {} for name in lectures})
+                self.save()
+        return self.live_lectures[course.name]
+
+    def keys(self, lecture: Lecture) -> tuple[str, str, str] | None:
+        with self.lock:
+            for course, groups in self.live_lectures.items():
+                if groups.get(lecture.group, {}).get(lecture.name) is lecture:
+                    return course, lecture.group, lecture.name
+        return None
+
+    def pages(self, lecture: Lecture) -> dict[str, Page]:
+        keys = self.keys(lecture)
+        if keys is None or keys not in self.live_pages or self.stale(*keys):
+            self.wait()
+            pages = {page.name: page for page in lecture.pages()}
+            if keys is None and pages:
+                first = next(iter(pages.values()))
+                keys = (first.course, first.group, first.lecture)
+            if keys is not None:
+                with self.lock:
+                    self.live_pages[keys] = pages
+                    self.record(
+                        keys, {name: {"prefix": p.prefix, "slides": len(p.slides)} for name, p in pages.items()}
+                    )
+                    self.save()
+            return pages
+        return self.live_pages[keys]
+
+    def save(self) -> None:
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp = f"{self.path}.tmp"
+            with open(temp, "w", encoding="UTF-8") as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(temp, self.path)
@@ -0,0 +1,181 @@
+import argparse
+import getpass
+import multiprocessing
+import os
+import sys
+from fnmatch import fnmatch
+
+import requests
+from iniad import Moocs, Page
+
+from archive import ZipOutput
+from assets import AssetStore
+from cache import ImageCache
+from catalog import Catalog
+from events import Event, JsonLines, Metrics
+from jobs import JobQueue
+from manifest import Manifest
+from optimize import Optimizer, raster_supported
+from pipeline import Pipeline, RateLimiter
+from repair import RepairQueue, repair
+from session import create_session
+from utils import ImageFetcher, embed
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download INIAD Moocs slides without the GUI")
+    parser.add_argument("output", help="output directory")
+    parser.add_argument("--course", default="*", help="course name or glob pattern")
+    parser.add_argument("--group", default="*", help="group name or glob pattern")
+    parser.add_argument("--lecture", default="*", help="lecture name or glob pattern")
+    parser.add_argument("--page", default="*", help="page name or glob pattern")
+    parser.add_argument("--username", default=os.environ.get("MOOCS_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("MOOCS_PASSWORD"))
+    parser.add_argument("--queue", help="job queue file (default: <output>/.jobs.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore finished jobs and start over")
+    parser.add_argument("--incremental", action="store_true", help="skip pages that have not changed")
+    parser.add_argument("--assets", action="store_true", help="store images in a shared assets directory")
+    parser.add_argument("--zip", action="store_true", help="write each course into one <course>.zip archive")
+    parser.add_argument("--optimize", action="store_true", help="recompress raster images and minify SVG images")
+    parser.add_argument("--max-size", type=int, default=1920, help="longest image edge in pixels when optimizing")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality when optimizing")
+    parser.add_argument("--repair", action="store_true", help="only retry images that previously failed")
+    parser.add_argument("--events", help="append structured events to this JSON-lines file")
+    parser.add_argument("--metrics", help="write Prometheus text-format metrics to this file when finished")
+    return parser.parse_args(argv)
+
+
+def login(username: str | None, password: str | None) -> Moocs:
+    username = username or input("Username: ")
+    password = password or getpass.getpass("Password: ")
+    moocs = Moocs(username, password)
+    moocs.login_google()
+    return moocs
+
+
+def select(catalog: Catalog, args: argparse.Namespace) -> list[Page]:
+    pages = []
+    for course_name, course in catalog.courses().items():
+        if not fnmatch(course_name, args.course):
+            continue
+        for group_name, lectures in catalog.lectures(course).items():
+            if not fnmatch(group_name, args.group):
+                continue
+            for lecture_name, lecture in lectures.items():
+                if not fnmatch(lecture_name, args.lecture):
+                    continue
+                for page_name, page in catalog.pages(lecture).items():
+                    if fnmatch(page_name, args.page) and len(page.slides) > 0:
+                        pages.append(page)
+    return pages
+
+
+def repair_images(
+    args: argparse.Namespace, fetcher: ImageFetcher, assets: AssetStore | None, optimizer: Optimizer | None
+) -> int:
+    def resolve(href: str, directory: str) -> str | None:
+        try:
+            content, _ = fetcher.fetch(href)
+            if optimizer is not None:
+                content = optimizer.optimize(content)
+            return embed(content, directory, assets, fetcher.cache)
+        except Exception as e:
+            fetcher.metrics.emit(Event("image", href, status="failed", error=repr(e)))
+            return None
+
+    archive = ZipOutput(args.output) if args.zip else None
+    remaining = repair(RepairQueue(os.path.join(args.output, ".repair.json")), resolve, archive)
+    if fetcher.cache is not None:
+        fetcher.cache.save()
+    print(f"Repair finished, {remaining} images still failing", flush=True)
+    return 1 if remaining else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if not os.path.isdir(args.output):
+        print("Output directory does not exist", file=sys.stderr)
+        return 2
+
+    moocs = login(args.username, args.password)
+    session = create_session(moocs)
+    cache = ImageCache(os.path.join(args.output, ".cache"))
+    assets = AssetStore(os.path.join(args.output, "assets")) if args.assets else None
+    optimizer = None
+    if args.optimize:
+        if not raster_supported():
+            print("Pillow is not installed, PNG and JPEG images will not be recompressed", file=sys.stderr)
+        optimizer = Optimizer(args.max_size, args.quality, root=os.path.join(args.output, ".cache", "optimized"))
+    metrics = Metrics()
+    if args.events:
+        events = JsonLines(args.events)
+        metrics.sinks.append(events)
+
+    try:
+        if args.repair:
+            return repair_images(args, ImageFetcher(session, cache, metrics=metrics), assets, optimizer)
+        return download(args, moocs, session, cache, assets, optimizer, metrics)
+    finally:
+        if optimizer is not None:
+            optimizer.close()
+        if args.events:
+            events.close()
+        if args.metrics:
+            with open(args.metrics, "w", encoding="UTF-8") as f:
+                f.write(metrics.prometheus())
+
+
+def download(
+    args: argparse.Namespace,
+    moocs: Moocs,
+    session: requests.Session,
+    cache: ImageCache,
+    assets: AssetStore | None,
+    optimizer: Optimizer | None,
+    metrics: Metrics,
+) -> int:
+    limiter = RateLimiter()
+    catalog = Catalog(moocs, throttle=limiter.acquire)
+    queue = JobQueue(args.queue or os.path.join(args.output, ".jobs.json"))
+
+    pages = select(catalog, args)
+    prefixes = [page.prefix for page in pages]
+    if args.restart or queue.finished(prefixes):
+        queue.reset(prefixes)
+    for prefix in prefixes:
+        queue.add(prefix)
+    queue.save()
+    pending = set(queue.pending())
+    targets = [page for page in pages if page.prefix in pending]
+    print(f"{len(targets)} of {len(pages)} pages to download", flush=True)
+
+    archive = ZipOutput(args.output) if args.zip else None
+    manifest = None
+    if args.incremental:
+        exists = archive.exists if archive else os.path.exists
+        manifest = Manifest(os.path.join(args.output, ".manifest.json"), exists=exists)
+
+    pipeline = Pipeline(
+        args.output,
+        cache=cache,
+        manifest=manifest,
+        assets=assets,
+        catalog=catalog,
+        session=session,
+        metrics=metrics,
+        repairs=RepairQueue(os.path.join(args.output, ".repair.json")),
+        optimizer=optimizer,
+        archive=archive,
+        limiter=limiter,
+        log=lambda message: print(message, flush=True),
+        done=lambda dl: queue.finish(dl.page.prefix),
+    )
+    errors = pipeline.run(targets)
+    remaining = len(set(queue.pending()) & set(prefixes))
+    print(f"Finished with {len(errors)} errors, {remaining} pages pending", flush=True)
+    return 1 if remaining else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
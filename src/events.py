@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+
+
+@dataclass
+class Event:
+    kind: str
+    name: str
+    seconds: float = 0.0
+    bytes: int = 0
+    status: str = "ok"
+    cache: str | None = None
+    error: str | None = None
+    page: str | None = None
+    retries: int = 0
+    failures: int = 0
+    time: float = field(default_factory=time.time)
+
+
+@dataclass
+class Metrics:
+    sinks: list[Callable[[Event], None]] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.events = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.bytes = defaultdict(int)
+        self.cache = defaultdict(int)
+
+    def emit(self, event: Event) -> None:
+        with self.lock:
+            self.events[event.kind, event.status] += 1
+            self.seconds[event.kind] += event.seconds
+            self.bytes[event.kind] += event.bytes
+            if event.cache is not None:
+                self.cache[event.cache] += 1
+        for sink in self.sinks:
+            sink(event)
+
+    def prometheus(self) -> str:
+        lines = ["# TYPE moocs_events_total counter"]
+        with self.lock:
+            for (kind, status), count in sorted(self.events.items()):
+                lines.append(f'moocs_events_total{{kind="{kind}",status="{status}"}} {count}')
+            lines.append("# TYPE moocs_seconds_total counter")
+            for kind, seconds in sorted(self.seconds.items()):
+                lines.append(f'moocs_seconds_total{{kind="{kind}"}} {seconds:.6f}')
+            lines.append("# TYPE moocs_bytes_total counter")
+            for kind, size in sorted(self.bytes.items()):
+                lines.append(f'moocs_bytes_total{{kind="{kind}"}} {size}')
+            lines.append("# TYPE moocs_image_cache_total counter")
+            for result, count in sorted(self.cache.items()):
+                lines.append(f'moocs_image_cache_total{{result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class JsonLines:
+    path: str
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.file = open(self.path, "a", encoding="UTF-8")
+
+    def __call__(self, event: Event) -> None:
+        line = json.dumps(asdict(event), ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+@dataclass
+class Progress:
+    callback: Callable[[int, int, float | None], None]
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.finished = 0
+        self.start = time.monotonic()
+
+    def __call__(self, event: Event) -> None:
+        if event.kind != "page":
+            return
+        with self.lock:
+            if event.status == "queued":
+                self.queued += 1
+            else:
+                self.finished += 1
+            elapsed = time.monotonic() - self.start
+            eta = elapsed / self.finished * (self.queued - self.finished) if self.finished else None
+            finished, queued = self.finished, self.queued
+        self.callback(finished, queued, eta)
@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+
+PENDING = "pending"
+DONE = "done"
+
+
+@dataclass
+class JobQueue:
+    path: str
+    jobs: dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.lock = threading.RLock()
+        try:
+            with open(self.path, encoding="UTF-8") as f:
+                self.jobs = json.load(f)
+        except (OSError, ValueError):
+            self.jobs = {}
+
+    def add(self, prefix: str) -> None:
+        with self.lock:
+            self.jobs.setdefault(prefix, PENDING)
+
+    def finish(self, prefix: str) -> None:
+        with self.lock:
+            self.jobs[prefix] = DONE
+            self.save()
+
+    def pending(self) -> list[str]:
+        with self.lock:
+            return [prefix for prefix, status in self.jobs.items() if status == PENDING]
+
+    def finished(self, prefixes: list[str]) -> bool:
+        with self.lock:
+            return all(self.jobs.get(prefix) == DONE for prefix in prefixes)
+
+    def reset(self, prefixes: list[str]) -> None:
+        with self.lock:
+            for prefix in prefixes:
+                self.jobs[prefix] = PENDING
+            self.save()
+
+    def save(self) -> None:
+        with self.lock:
+            temp = f"{self.path}.tmp"
+            with open(temp, "w", encoding="UTF-8") as f:
+                json.dump(self.jobs, f, ensure_ascii=False)
+            os.replace(temp, self.path)
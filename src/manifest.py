@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+def fingerprint(slides: list[list[str]], options: dict | None = None) -> str:
+    data = json.dumps([slides, options or {}], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Manifest:
+    path: str
+    pages: dict[str, dict] = field(default_factory=dict)
+    exists: Callable[[str], bool] = os.path.exists
+
+    def __post_init__(self) -> None:
+        self.lock = threading.RLock()
+        self.root = os.path.dirname(os.path.abspath(self.path))
+        try:
+            with open(self.path, encoding="UTF-8") as f:
+                self.pages = json.load(f)
+        except (OSError, ValueError):
+            self.pages = {}
+
+    def unchanged(self, prefix: str, fingerprint: str) -> bool:
+        with self.lock:
+            entry = self.pages.get(prefix)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+        return all(self.exists(os.path.join(self.root, file)) for file in entry["files"])
+
+    def update(self, prefix: str, fingerprint: str, files: list[str]) -> None:
+        files = [os.path.relpath(os.path.abspath(file), self.root) for file in files]
+        with self.lock:
+            self.pages[prefix] = {"fingerprint": fingerprint, "files": files}
+            self.save()
+
+    def save(self) -> None:
+        with self.lock:
+            temp = f"{self.path}.tmp"
+            with open(temp, "w", encoding="UTF-8") as f:
+                json.dump(self.pages, f, ensure_ascii=False)
+            os.replace(temp, self.path)
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from lxml import etree
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def raster_supported() -> bool:
+    return Image is not None
+
+
+def minify_svg(content: bytes) -> bytes:
+    parser = etree.XMLParser(remove_comments=True, remove_blank_text=True, huge_tree=True, resolve_entities=False)
+    root = etree.fromstring(content, parser)
+    for elm in root.iter("{http://www.w3.org/2000/svg}metadata"):
+        elm.getparent().remove(elm)
+    return etree.tostring(root, encoding="utf-8", xml_declaration=False)
+
+
+def recompress(content: bytes, max_size: int, quality: int) -> bytes:
+    if Image is None:
+        return content
+    with Image.open(io.BytesIO(content)) as image:
+        if getattr(image, "is_animated", False):
+            return content
+        fmt = image.format
+        if max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if fmt == "PNG":
+            image.save(buffer, "PNG", optimize=True)
+        elif fmt == "JPEG":
+            image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            return content
+    return buffer.getvalue()
+
+
+def optimize(content: bytes, max_size: int, quality: int) -> bytes:
+    try:
+        if content.startswith(b"<?xml") or content.startswith(b"<svg"):
+            result = minify_svg(content)
+        elif content.startswith(b"\x89PNG") or content.startswith(b"\xff\xd8"):
+            result = recompress(content, max_size, quality)
+        else:
+            return content
+    except Exception:
+        return content
+    return result if len(result) < len(content) else content
+
+
+@dataclass
+class Optimizer:
+    max_size: int = 1920
+    quality: int = 80
+    threshold: int = 32 * 1024
+    workers: int | None = None
+    root: str | None = None
+    max_bytes: int = 512 * 1024 * 1024
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.pool: ProcessPoolExecutor | None = None
+        self.memo: dict[str, bytes] = {}
+        self.size = 0
+        if self.root is not None:
+            os.makedirs(self.root, exist_ok=True)
+            self.size = sum(entry.stat().st_size for entry in os.scandir(self.root) if entry.is_file())
+
+    def key(self, content: bytes) -> str:
+        return f"{hashlib.sha256(content).hexdigest()}-{self.max_size}-{self.quality}"
+
+    def optimize(self, content: bytes) -> bytes:
+        if len(content) < self.threshold:
+            return content
+        key = self.key(content)
+        if key in self.memo:
+            return self.memo[key]
+        path = os.path.join(self.root, key) if self.root is not None else None
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                result = f.read()
+            os.utime(path)
+        else:
+            with self.lock:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            result = self.pool.submit(optimize, content, self.max_size, self.quality).result()
+            if path is not None:
+                self.store(path, result)
+        if path is None:
+            self.memo[key] = result
+        return result
+
+    def store(self, path: str, result: bytes) -> None:
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(result)
+        os.replace(temp, path)
+        with self.lock:
+            self.size += len(result)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self) -> None:
+        entries = [entry for entry in os.scandir(self.root) if entry.is_file() and not entry.name.endswith(".tmp")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.size -= entry.stat().st_size
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
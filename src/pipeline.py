@@ -0,0 +1,189 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+import requests
+from iniad import Course, Lecture, Page
+
+from archive import ZipOutput
+from assets import AssetStore
+from cache import ImageCache
+from catalog import Catalog
+from events import Event, Metrics
+from manifest import Manifest
+from optimize import Optimizer
+from repair import RepairQueue
+from retry import AdaptiveTimeout, RetryPolicy
+from session import create_session
+from utils import DLSlides, Window
+
+DONE = object()
+
+
+@dataclass
+class RateLimiter:
+    rate: float = 2.0
+    burst: int = 2
+
+    def __post_init__(self) -> None:
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class Pipeline:
+    out: str
+    cache: ImageCache | None = None
+    manifest: Manifest | None = None
+    assets: AssetStore | None = None
+    catalog: Catalog | None = None
+    session: requests.Session = field(default_factory=create_session)
+    metrics: Metrics = field(default_factory=Metrics)
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    timeout: AdaptiveTimeout = field(default_factory=AdaptiveTimeout)
+    repairs: RepairQueue | None = None
+    optimizer: Optimizer | None = None
+    archive: ZipOutput | None = None
+    limiter: RateLimiter = field(default_factory=RateLimiter)
+    page_workers: int = 2
+    svg_workers: int = 4
+    image_workers: int = 16
+    render_workers: int = 2
+    queue_size: int = 8
+    log: Callable[[str], None] = print
+    done: Callable[[DLSlides], None] | None = None
+
+    def run(self, targets: Iterable[Course | Lecture | Page]) -> list[tuple[object, Exception]]:
+        self.errors = []
+        inboxes = [queue.Queue(self.queue_size) for _ in range(3)] + [queue.Queue(self.render_workers)]
+
+        with ThreadPoolExecutor(max_workers=self.image_workers) as self.executor:
+            stages = [
+                self.stage(self.enumerate, inboxes[0], inboxes[1], self.page_workers),
+                self.stage(self.fetch, inboxes[1], inboxes[2], self.svg_workers),
+                self.stage(self.inline, inboxes[2], inboxes[3], 1),
+                self.stage(self.render, inboxes[3], None, self.render_workers),
+            ]
+            for target in targets:
+                inboxes[0].put(target)
+            inboxes[0].put(DONE)
+            for threads, outbox in zip(stages, inboxes[1:] + [None]):
+                for thread in threads:
+                    thread.join()
+                if outbox is not None:
+                    outbox.put(DONE)
+
+        if self.archive is not None:
+            self.archive.close()
+        if self.cache is not None:
+            self.cache.save()
+        return self.errors
+
+    def stage(self, work: Callable, inbox: queue.Queue, outbox: queue.Queue | None, workers: int):
+        def worker():
+            while (item := inbox.get()) is not DONE:
+                try:
+                    for result in work(item):
+                        if outbox is not None:
+                            outbox.put(result)
+                except Exception as e:
+                    self.errors.append((item, e))
+                    self.failed(item, e)
+            inbox.put(DONE)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def failed(self, item, error: Exception) -> None:
+        dl = item[0] if isinstance(item, tuple) else item
+        if isinstance(dl, DLSlides):
+            self.metrics.emit(Event("page", dl.page.prefix, status="failed", error=repr(error)))
+            self.log(f"Failed {dl.page.name}: {error}")
+        else:
+            self.metrics.emit(Event("enumerate", getattr(item, "name", str(item)), status="failed", error=repr(error)))
+            self.log(f"Failed {getattr(item, 'name', item)}: {error}")
+
+    def throttle(self) -> None:
+        start = time.perf_counter()
+        self.limiter.acquire()
+        self.metrics.emit(Event("throttle", "limiter", time.perf_counter() - start))
+
+    def enumerate(self, target: Course | Lecture | Page):
+        if isinstance(target, Page):
+            yield from self.prepare([target])
+            return
+        lectures = self.lectures(target) if isinstance(target, Course) else [target]
+        for lecture in lectures:
+            yield from self.prepare(self.pages(lecture))
+
+    def lectures(self, course: Course) -> list[Lecture]:
+        if self.catalog is None:
+            self.throttle()
+            return course.lectures()
+        return [lecture for group in self.catalog.lectures(course).values() for lecture in group.values()]
+
+    def pages(self, lecture: Lecture) -> list[Page]:
+        if self.catalog is None:
+            self.throttle()
+            return lecture.pages()
+        return list(self.catalog.pages(lecture).values())
+
+    def prepare(self, pages: Iterable[Page]):
+        for page in pages:
+            if len(page.slides) > 0:
+                self.metrics.emit(Event("page", page.prefix, status="queued"))
+                yield DLSlides(
+                    page,
+                    self.out,
+                    cache=self.cache,
+                    manifest=self.manifest,
+                    assets=self.assets,
+                    session=self.session,
+                    metrics=self.metrics,
+                    retry=self.retry,
+                    timeout=self.timeout,
+                    repairs=self.repairs,
+                    optimizer=self.optimizer,
+                    archive=self.archive,
+                    executor=self.executor,
+                    lazy=True,
+                )
+
+    def fetch(self, dl: DLSlides):
+        self.log(f"Downloading {dl.page.name} from {dl.page.lecture} in {dl.page.course}")
+        self.throttle()
+        if dl.fetch():
+            yield dl
+        else:
+            self.log(f"Unchanged {dl.page.name}")
+            if self.done is not None:
+                self.done(dl)
+
+    def inline(self, dl: DLSlides):
+        yield dl, dl.inline()
+
+    def render(self, item: tuple[DLSlides, Window]):
+        dl, results = item
+        dl.render(results)
+        if self.done is not None and self.archive is not None:
+            self.archive.after(lambda: self.done(dl))
+        elif self.done is not None:
+            self.done(dl)
+        return ()
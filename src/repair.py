@@ -0,0 +1,88 @@
+import html
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+from archive import ZipOutput
+
+
+@dataclass
+class RepairQueue:
+    path: str
+    files: dict[str, list[str]] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.lock = threading.RLock()
+        self.root = os.path.dirname(os.path.abspath(self.path))
+        try:
+            with open(self.path, encoding="UTF-8") as f:
+                self.files = json.load(f)
+        except (OSError, ValueError):
+            self.files = {}
+
+    def set(self, file: str, hrefs: list[str]) -> None:
+        key = os.path.relpath(os.path.abspath(file), self.root)
+        with self.lock:
+            if hrefs:
+                self.files[key] = list(hrefs)
+            else:
+                self.files.pop(key, None)
+
+    def items(self) -> list[tuple[str, list[str]]]:
+        with self.lock:
+            return [(os.path.join(self.root, key), list(hrefs)) for key, hrefs in self.files.items()]
+
+    def save(self) -> None:
+        with self.lock:
+            temp = f"{self.path}.tmp"
+            with open(temp, "w", encoding="UTF-8") as f:
+                json.dump(self.files, f, ensure_ascii=False)
+            os.replace(temp, self.path)
+
+
+def patch(file: str, images: dict[str, str], archive: ZipOutput | None = None) -> None:
+    if archive is None:
+        with open(file, encoding="UTF-8") as f:
+            text = f.read()
+    else:
+        text = archive.read(file).decode("utf-8")
+    for href, image in images.items():
+        for quoted in {html.escape(href, quote=False), html.escape(href)}:
+            for q in ('"', "'"):
+                text = text.replace(f"xlink:href={q}{quoted}{q}", f"xlink:href={q}{html.escape(image)}{q}")
+    if archive is None:
+        temp = f"{file}.tmp"
+        with open(temp, "w", encoding="UTF-8") as f:
+            f.write(text)
+        os.replace(temp, file)
+    else:
+        temp = os.path.join(archive.root, f".repair-{threading.get_ident()}.tmp")
+        with open(temp, "w", encoding="UTF-8") as f:
+            f.write(text)
+        archive.commit(temp, file)
+
+
+def repair(queue: RepairQueue, resolve: Callable[[str, str], str | None], archive: ZipOutput | None = None) -> int:
+    exists = archive.exists if archive is not None else os.path.exists
+    remaining = 0
+    for file, hrefs in queue.items():
+        if not exists(file):
+            queue.set(file, [])
+            continue
+        directory = os.path.dirname(file)
+        images = {}
+        for href in hrefs:
+            image = resolve(href, directory)
+            if image:
+                images[href] = image
+        if images:
+            patch(file, images, archive)
+        failed = [href for href in hrefs if href not in images]
+        queue.set(file, failed)
+        remaining += len(failed)
+    if archive is not None:
+        archive.close()
+    queue.save()
+    return remaining
@@ -0,0 +1,45 @@
+import random
+import threading
+from dataclasses import dataclass
+
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 4
+    base: float = 0.5
+    cap: float = 15.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2**attempt))
+
+
+@dataclass
+class AdaptiveTimeout:
+    minimum: float = 3.0
+    maximum: float = 60.0
+    factor: float = 4.0
+    alpha: float = 0.2
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latency: float | None = None
+        self.throughput: float | None = None
+
+    def observe(self, latency: float, seconds: float, size: int) -> None:
+        with self.lock:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+            if size > 0 and seconds > 0:
+                rate = size / seconds
+                self.throughput = (
+                    rate if self.throughput is None else self.throughput + self.alpha * (rate - self.throughput)
+                )
+
+    def timeout(self, attempt: int = 0, size: int | None = None) -> tuple[float, float]:
+        with self.lock:
+            latency = self.latency or 0.0
+            transfer = size / self.throughput if size and self.throughput else 0.0
+        read = min(self.maximum, max(self.minimum, (latency + transfer) * self.factor) * 2**attempt)
+        connect = min(self.maximum, max(self.minimum, latency * self.factor) * 2**attempt)
+        return connect, read
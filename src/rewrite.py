@@ -0,0 +1,39 @@
+from typing import Callable
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+SVG_IMAGE = "{http://www.w3.org/2000/svg}image"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+
+def rewrite_bs4(svg: str, resolve: Callable[[str], str | None]) -> str:
+    soup = BeautifulSoup(svg, "xml")
+
+    for img in soup.select("image"):
+        href = img.attrs["xlink:href"]
+        image = resolve(href)
+        img.attrs["xlink:href"] = image if image else href
+
+    svg_elm = soup.select_one("svg")
+    return str(svg_elm)
+
+
+def rewrite_lxml(svg: str, resolve: Callable[[str], str | None]) -> str:
+    parser = etree.XMLParser(huge_tree=True, resolve_entities=False, recover=True)
+    root = etree.fromstring(svg.encode("utf-8"), parser)
+    if root is None:
+        return rewrite_bs4(svg, resolve)
+
+    for img in root.iter(SVG_IMAGE, "image"):
+        href = img.get(XLINK_HREF)
+        if href is None:
+            continue
+        image = resolve(href)
+        if image:
+            img.set(XLINK_HREF, image)
+
+    return etree.tostring(root, encoding="unicode")
+
+
+rewriters = {"bs4": rewrite_bs4, "lxml": rewrite_lxml}
@@ -0,0 +1,13 @@
+import requests
+from iniad import Moocs
+from requests.adapters import HTTPAdapter
+
+
+def create_session(moocs: Moocs | None = None, pool_size: int = 32, per_host: int = 16) -> requests.Session:
+    session = getattr(moocs, "session", None)
+    if not isinstance(session, requests.Session):
+        session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=per_host, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -1,11 +1,20 @@
+import multiprocessing
 import os
-import time
 
 import PySimpleGUI as sg
-from iniad import Course, Lecture, Moocs, Page
+from iniad import Moocs
 
+from archive import ZipOutput
+from assets import AssetStore
+from cache import ImageCache
+from catalog import Catalog
+from events import Metrics, Progress
 from login import LoginPopup
-from utils import DLSlides
+from manifest import Manifest
+from optimize import Optimizer, raster_supported
+from pipeline import Pipeline, RateLimiter
+from repair import RepairQueue
+from session import create_session
 
 text_width = 10
 combo_width = 50
@@ -19,6 +28,7 @@ combo_size = (combo_width, combo_height)
 input_size = (combo_width - button_width, input_height)
 button_size = (button_width, input_height)
 output_size = (output_width, output_height)
+progress_size = (output_width - text_width - 10, 20)
 font = ("Helvetica", 12)
 
 layout = [
@@ -78,71 +88,119 @@ layout = [
     [
         sg.MLine(size=output_size, font=font, key="output" + sg.WRITE_ONLY_KEY),
     ],
+    [
+        sg.ProgressBar(1, orientation="h", size=progress_size, key="progress"),
+        sg.Text("", size=(text_width * 2, text_height), font=font, key="eta"),
+    ],
     [
         sg.Button("Download", size=button_size, font=font, key="download"),
+        sg.Checkbox("Skip unchanged pages", key="incremental", font=font),
+        sg.Checkbox("Shared image assets", key="assets", font=font),
+        sg.Checkbox("Recompress images", key="optimize", font=font),
+        sg.Checkbox("Zip per course", key="zip", font=font),
     ],
 ]
 
 
-def download(selected_course, selected_group, selected_lecture, selected_page, courses, groups, pages, window, output):
+def download(
+    selected_course,
+    selected_group,
+    selected_lecture,
+    selected_page,
+    catalog,
+    limiter,
+    window,
+    output,
+    incremental,
+    shared_assets,
+    recompress,
+    zip_output,
+    session,
+):
     window["download"].Update(disabled=True)
     log_area = window["output" + sg.WRITE_ONLY_KEY]
+    cache = ImageCache(os.path.join(output, ".cache"))
+    archive = ZipOutput(output) if zip_output else None
+    manifest = None
+    if incremental:
+        manifest = Manifest(
+            os.path.join(output, ".manifest.json"), exists=archive.exists if archive else os.path.exists
+        )
+    assets = AssetStore(os.path.join(output, "assets")) if shared_assets else None
+    optimizer = Optimizer(root=os.path.join(output, ".cache", "optimized")) if recompress else None
+    if recompress and not raster_supported():
+        log_area.print("Pillow is not installed, PNG and JPEG images will not be recompressed")
 
     if selected_course == "All":
-        for course in courses.values():
-            for lecture in course.lectures():
-                for page in lecture.pages():
-                    if len(page.slides) == 0:
-                        continue
-                    log = f"Downloading {page.name} from {lecture.name} in {course.name}"
-                    log_area.print(log)
-                    DLSlides(page, output)
-                    time.sleep(1)
+        targets = list(catalog.courses().values())
     elif selected_group == "All":
-        course = courses[selected_course]
-        for lecture in course.lectures():
-            for page in lecture.pages():
-                if len(page.slides) == 0:
-                    continue
-                log = f"Downloading {page.name} from {lecture.name}"
-                log_area.print(log)
-                DLSlides(page, output)
-                time.sleep(1)
-    elif selected_lecture == "All":
-        lectures = groups[selected_group]
-        for lecture in lectures.values():
-            for page in lecture.pages():
-                if len(page.slides) == 0:
-                    continue
-                log = f"Downloading {page.name} from {lecture.name}"
-                log_area.print(log)
-                DLSlides(page, output)
-                time.sleep(1)
-    elif selected_page == "All":
-        lecture = groups[selected_group][selected_lecture]
-        for page in lecture.pages():
-            if len(page.slides) == 0:
-                continue
-            log = f"Downloading {page.name}"
-            log_area.print(log)
-            DLSlides(page, output)
-            time.sleep(1)
+        targets = [catalog.courses()[selected_course]]
     else:
-        page = pages[selected_page]
-        if len(page.slides) > 0:
-            log = f"Downloading {page.name}"
-            log_area.print(log)
-            DLSlides(page, output)
+        lectures = catalog.lectures(catalog.courses()[selected_course])[selected_group]
+        if selected_lecture == "All":
+            targets = list(lectures.values())
+        elif selected_page == "All":
+            targets = [lectures[selected_lecture]]
+        else:
+            targets = [catalog.pages(lectures[selected_lecture])[selected_page]]
+
+    def report(event):
+        if event.kind == "image" and event.status == "failed":
+            log_area.print(f"Kept remote image {event.name} in {event.page}: {event.error}")
+
+    progress = Progress(lambda finished, queued, eta: window.write_event_value("-PROGRESS-", (finished, queued, eta)))
+    pipeline = Pipeline(
+        output,
+        cache=cache,
+        manifest=manifest,
+        assets=assets,
+        session=session,
+        catalog=catalog,
+        metrics=Metrics([progress, report]),
+        repairs=RepairQueue(os.path.join(output, ".repair.json")),
+        optimizer=optimizer,
+        archive=archive,
+        limiter=limiter,
+        log=log_area.print,
+    )
+    pipeline.run(targets)
+    if optimizer is not None:
+        optimizer.close()
     window["download"].Update(disabled=False)
 
 
+def fill(window, key, names, value="All"):
+    values = ["All"] + names
+    window[key].Update(values=values, disabled=False, value=value if value in values else "All")
+
+
+def refresh_courses(catalog):
+    catalog.courses()
+
+
+def refresh_groups(catalog, selected_course):
+    catalog.lectures(catalog.courses()[selected_course])
+    return selected_course
+
+
+def refresh_pages(catalog, selected_course, selected_group, selected_lecture):
+    lectures = catalog.lectures(catalog.courses()[selected_course])
+    catalog.pages(lectures[selected_group][selected_lecture])
+    return selected_course, selected_group, selected_lecture
+
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     moocs: Moocs = LoginPopup().show()
+    session = create_session(moocs)
+    limiter = RateLimiter()
+    catalog = Catalog(moocs, throttle=limiter.acquire)
     window = sg.Window("Download", layout, finalize=True)
-    courses: dict[str:Course] = {course.name: course for course in moocs.courses()}
-    groups: dict[str : dict[str:Lecture]] = {}
-    pages: dict[str:Page] = {}
-    window["course"].Update(values=["All"] + [key for key in courses.keys()], disabled=False, value="All")
+
+    if (names := catalog.cached()) is not None:
+        fill(window, "course", names)
+    if catalog.stale():
+        window.start_thread(lambda: refresh_courses(catalog), "-COURSES-")
 
     while True:
         event, values = window.read()
@@ -151,6 +209,9 @@ if __name__ == "__main__":
             case sg.WIN_CLOSED:
                 break
 
+            case "-COURSES-":
+                fill(window, "course", catalog.cached() or [], values["course"])
+
             case "course":
                 selected_course: str = values["course"]
 
@@ -158,49 +219,61 @@ if __name__ == "__main__":
                     case "All":
                         window["group"].Update(values=["All"], disabled=True, value="All")
                     case _:
-                        course = courses[selected_course]
-                        lectures = course.lectures()
-                        groups.clear()
-                        for lecture in lectures:
-                            if lecture.group not in groups:
-                                groups[lecture.group] = {}
-                            groups[lecture.group][lecture.name] = lecture
-                        window["group"].Update(
-                            values=["All"] + [key for key in groups.keys()], disabled=False, value="All"
-                        )
+                        if (names := catalog.cached(selected_course)) is not None:
+                            fill(window, "group", names)
+                        else:
+                            window["group"].Update(values=["All"], disabled=True, value="All")
+                        if catalog.stale(selected_course):
+                            window.start_thread(
+                                lambda course=selected_course: refresh_groups(catalog, course), "-GROUPS-"
+                            )
 
                 window["lecture"].Update(values=["All"], disabled=True, value="All")
                 window["page"].Update(values=["All"], disabled=True, value="All")
 
+            case "-GROUPS-":
+                if values[event] == values["course"]:
+                    fill(window, "group", catalog.cached(values["course"]) or [], values["group"])
+                    if values["group"] != "All":
+                        fill(
+                            window,
+                            "lecture",
+                            catalog.cached(values["course"], values["group"]) or [],
+                            values["lecture"],
+                        )
+
             case "group":
+                selected_course: str = values["course"]
                 selected_group: str = values["group"]
 
                 match selected_group:
                     case "All":
                         window["lecture"].Update(values=["All"], disabled=True, value="All")
                     case _:
-                        lectures = groups[selected_group]
-                        window["lecture"].Update(
-                            values=["All"] + [key for key in lectures.keys()], disabled=False, value="All"
-                        )
+                        fill(window, "lecture", catalog.cached(selected_course, selected_group) or [])
 
                 window["page"].Update(values=["All"], disabled=True, value="All")
 
             case "lecture":
-                selected_lecture: str = values["lecture"]
+                selected_course: str = values["course"]
                 selected_group: str = values["group"]
+                selected_lecture: str = values["lecture"]
 
                 match selected_lecture:
                     case "All":
                         window["page"].Update(values=["All"], disabled=True, value="All")
                     case _:
-                        lecture: Lecture = groups[selected_group][selected_lecture]
-                        pages = {page.name: page for page in lecture.pages()}
-                        window["page"].Update(
-                            values=["All"] + [key for key in pages.keys() if pages[key].slides],
-                            disabled=False,
-                            value="All",
-                        )
+                        keys = (selected_course, selected_group, selected_lecture)
+                        if (names := catalog.cached(*keys)) is not None:
+                            fill(window, "page", names)
+                        else:
+                            window["page"].Update(values=["All"], disabled=True, value="All")
+                        if catalog.stale(*keys):
+                            window.start_thread(lambda keys=keys: refresh_pages(catalog, *keys), "-PAGES-")
+
+            case "-PAGES-":
+                if values[event] == (values["course"], values["group"], values["lecture"]):
+                    fill(window, "page", catalog.cached(*values[event]) or [], values["page"])
 
             case "page":
                 pass
@@ -222,15 +295,25 @@ if __name__ == "__main__":
                         selected_group,
                         selected_lecture,
                         selected_page,
-                        courses,
-                        groups,
-                        pages,
+                        catalog,
+                        limiter,
                         window,
                         output,
+                        values["incremental"],
+                        values["assets"],
+                        values["optimize"],
+                        values["zip"],
+                        session,
                     ),
                     "-THREAD ENDED-",
                 )
 
+            case "-PROGRESS-":
+                finished, queued, eta = values[event]
+                window["progress"].update(current_count=finished, max=max(queued, 1))
+                remaining = f" ETA {int(eta) // 60}:{int(eta) % 60:02}" if eta is not None else ""
+                window["eta"].update(f"{finished}/{queued}{remaining}")
+
             case "-THREAD ENDED-":
                 sg.popup("Download finished")
 
@@ -1,14 +1,33 @@
 import base64
+import html
+import itertools
 import os
 import re
 import tempfile
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator
 
 import requests
 from bs4 import BeautifulSoup
 from iniad import Page
 
+from archive import ZipOutput
+from assets import AssetStore
+from cache import ImageCache
+from events import Event, Metrics
+from manifest import Manifest, fingerprint
+from optimize import Optimizer
+from repair import RepairQueue
+from retry import RETRY_STATUS, AdaptiveTimeout, RetryPolicy
+from rewrite import rewriters
+from session import create_session
+
+image_href = re.compile(r"<image\b[^>]*?\bxlink:href\s*=\s*([\"'])(.*?)\1", re.S)
+
 
 def ext(b: bytes) -> str:
     if b.startswith(b"\x89PNG"):
@@ -23,6 +42,56 @@ def ext(b: bytes) -> str:
         raise ValueError("Unknown image format")
 
 
+def data_uri(b: bytes) -> str:
+    extension = ext(b)
+    encoded = base64.b64encode(b).decode("utf-8")
+
+    if extension in ("jpg", "png", "gif"):
+        return f"data:image/{extension};base64,{encoded}"
+    elif extension == "svg":
+        return f"data:image/svg+xml;base64,{encoded}"
+    else:
+        raise ValueError("Unknown image format")
+
+
+def embed(content: bytes, directory: str, assets: AssetStore | None = None, cache: ImageCache | None = None) -> str:
+    if assets is None:
+        return data_uri(content)
+    path = assets.put(content, ext(content), cache)
+    return os.path.relpath(path, directory).replace(os.sep, "/")
+
+
+def image_hrefs(svg: str) -> set[str]:
+    return {html.unescape(match.group(2)) for match in image_href.finditer(svg)}
+
+
+@dataclass
+class Window:
+    executor: Executor
+    func: Callable
+    items: Iterable
+    size: int = 8
+
+    def __post_init__(self) -> None:
+        self.items = iter(self.items)
+        self.pending: deque[Future] = deque()
+        self.fill()
+
+    def fill(self) -> None:
+        for item in itertools.islice(self.items, self.size - len(self.pending)):
+            self.pending.append(self.executor.submit(self.func, item))
+
+    def __iter__(self) -> Iterator[Future]:
+        return self
+
+    def __next__(self) -> Future:
+        if not self.pending:
+            raise StopIteration
+        future = self.pending.popleft()
+        self.fill()
+        return future
+
+
 def fix(name: str) -> str:
     ban = ["\\", "/", ":", "*", "?", '"', "<", ">", "|"]
     return "".join([c for c in name if c not in ban]).strip()
@@ -33,68 +102,229 @@ class DLSlides:
     page: Page
     out: str
     downloaded_img: dict[str:str] = field(default_factory=dict)
+    cache: ImageCache | None = None
+    manifest: Manifest | None = None
+    skipped: bool = False
+    session: requests.Session = field(default_factory=create_session)
+    executor: Executor | None = None
+    lazy: bool = False
+    parser: str = "lxml"
+    assets: AssetStore | None = None
+    metrics: Metrics = field(default_factory=Metrics)
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    timeout: AdaptiveTimeout = field(default_factory=AdaptiveTimeout)
+    repairs: RepairQueue | None = None
+    optimizer: Optimizer | None = None
+    archive: ZipOutput | None = None
+    window: int = 8
 
     def __post_init__(self) -> None:
+        self.fetcher = ImageFetcher(self.session, self.cache, self.retry, self.timeout, self.metrics, self.page.prefix)
+        self.lock = threading.Lock()
+        self.img_locks: dict[str, threading.Lock] = {}
+        self.failed_img: set[str] = set()
         self.write = os.path.join(self.out, fix(self.page.course), fix(self.page.group), fix(self.page.lecture))
-        os.makedirs(self.write, exist_ok=True)
-        self.slides = list(self.page.slides2svg())
-        page_num = re.match(r"/courses/\d+/.+?/.+?/(.+)", self.page.prefix).group(1)
+        self.page_num = re.match(r"/courses/\d+/.+?/.+?/(.+)", self.page.prefix).group(1)
+        if not self.lazy and self.fetch():
+            if self.executor is not None:
+                self.render(self.inline())
+            else:
+                with ThreadPoolExecutor(max_workers=self.window) as self.executor:
+                    self.render(self.inline())
+
+    def fetch(self) -> bool:
+        start = time.perf_counter()
+        self.slides = [list(slide) for slide in self.page.slides2svg()]
+        size = sum(len(svg) for slide in self.slides for svg in slide)
+        self.metrics.emit(Event("svg", self.page.prefix, time.perf_counter() - start, size))
+        self.fingerprint = fingerprint(self.slides, self.options())
+        self.uses = Counter(href for slide in self.slides for svg in slide for href in image_hrefs(svg))
+        if self.manifest is not None and self.manifest.unchanged(self.page.prefix, self.fingerprint):
+            self.skipped = True
+            self.metrics.emit(Event("page", self.page.prefix, status="skipped"))
+        return not self.skipped
+
+    def options(self) -> dict:
+        options = {"parser": self.parser, "archive": self.archive is not None}
+        if self.assets is not None:
+            options["assets"] = os.path.relpath(self.assets.root, self.out).replace(os.sep, "/")
+        if self.optimizer is not None:
+            options["optimizer"] = [self.optimizer.max_size, self.optimizer.quality, self.optimizer.threshold]
+        return options
+
+    def inline(self) -> Window:
+        return Window(self.executor, self.process, (svg for slide in self.slides for svg in slide), self.window)
+
+    def render(self, results: Iterator[Future]) -> list[str]:
+        start = time.perf_counter()
+        if self.archive is None:
+            os.makedirs(self.write, exist_ok=True)
+        files = []
+        size = 0
 
         with tempfile.TemporaryDirectory(dir=self.out) as self.temp:
             for i, slide in enumerate(self.slides):
-                futures = []
-                with ThreadPoolExecutor(max_workers=8) as executor:
-                    for svg in slide:
-                        future = executor.submit(self.process, svg)
-                        futures.append(future)
                 title = f"{fix(self.page.name)}-{i}" if len(self.slides) > 1 else f"{fix(self.page.name)}"
-                template_soup = BeautifulSoup(html_template, "html.parser")
-                title_elm = template_soup.select_one("title")
-                slide_elm = template_soup.select_one("div#slide-container")
-                title_elm.append(title)
-                for future in futures:
-                    result = future.result()
-                    section = template_soup.new_tag("section")
-                    section.append(result)
-                    slide_elm.append(section)
-                html = str(template_soup)
-                path = os.path.join(self.write, f"{page_num} - {title}.html")
-                with open(path, "w", encoding="UTF-8") as f:
-                    f.write(html)
-
-    def process(self, svg: str):
-        soup = BeautifulSoup(svg, "xml")
-        image = soup.select("image")
-
-        for img in image:
-            href = img.attrs["xlink:href"]
-            if href in self.downloaded_img:
-                image = self.downloaded_img[href]
-            else:
+                temp = os.path.join(self.temp, f"{i}.html")
+                with open(temp, "wb") as f:
+                    f.write(template_head)
+                    f.write(html.escape(title, quote=False).encode("utf-8"))
+                    f.write(template_body)
+                    for _ in slide:
+                        f.write(b"<section>")
+                        f.write(next(results).result().encode("utf-8"))
+                        f.write(b"</section>")
+                    f.write(template_tail)
+                    size += f.tell()
+                path = os.path.join(self.write, f"{self.page_num} - {title}.html")
+                if self.archive is None:
+                    os.replace(temp, path)
+                else:
+                    self.archive.commit(temp, path)
+                files.append(path)
+                if self.repairs is not None:
+                    self.repairs.set(path, self.failed(self.slides[i]))
+
+        if self.cache is not None:
+            self.cache.save()
+        if self.manifest is not None:
+            self.manifest.update(self.page.prefix, self.fingerprint, files)
+        if self.repairs is not None:
+            self.repairs.save()
+        seconds = time.perf_counter() - start
+        failures = len(self.failed_img)
+        self.metrics.emit(
+            Event("page", self.page.prefix, seconds, size, retries=self.fetcher.retries, failures=failures)
+        )
+        return files
+
+    def failed(self, slide: list[str]) -> list[str]:
+        hrefs = {href for svg in slide for href in image_hrefs(svg)}
+        return sorted(hrefs & self.failed_img)
+
+    def process(self, svg: str) -> str:
+        start = time.perf_counter()
+        result = rewriters[self.parser](svg, self.resolve)
+        self.release(svg)
+        self.metrics.emit(Event("svg_rewrite", self.page.prefix, time.perf_counter() - start, len(result)))
+        return result
+
+    def resolve(self, href: str) -> str | None:
+        with self.lock:
+            lock = self.img_locks.setdefault(href, threading.Lock())
+        with lock:
+            if href not in self.downloaded_img:
                 image = self.dl_img(href)
+                if image is None:
+                    self.failed_img.add(href)
                 self.downloaded_img[href] = image
-            img.attrs["xlink:href"] = image if image else href
+            return self.downloaded_img[href]
 
-        svg_elm = soup.select_one("svg")
-        return svg_elm
+    def release(self, svg: str) -> None:
+        with self.lock:
+            for href in image_hrefs(svg):
+                self.uses[href] -= 1
+                if self.uses[href] <= 0:
+                    self.downloaded_img.pop(href, None)
 
     def dl_img(self, href: str) -> str:
+        start = time.perf_counter()
         try:
-            response = requests.get(href, timeout=3)
-            content = response.content
-            extension = ext(content)
-            encoded = base64.b64encode(content)
-
-            if extension in ("jpg", "png", "gif"):
-                image = f"data:image/{extension};base64,{encoded.decode('utf-8')}"
-            elif extension == "svg":
-                image = f"data:image/svg+xml;base64,{encoded.decode('utf-8')}"
+            content, cache = self.fetch_img(href)
+            if self.optimizer is not None:
+                content = self.shrink(href, content)
+            image = self.embed(content)
+        except Exception as e:
+            seconds = time.perf_counter() - start
+            self.metrics.emit(Event("image", href, seconds, status="failed", error=repr(e), page=self.page.prefix))
+            return
+        seconds = time.perf_counter() - start
+        self.metrics.emit(Event("image", href, seconds, len(content), cache=cache, page=self.page.prefix))
+        return image
+
+    def shrink(self, href: str, content: bytes) -> bytes:
+        start = time.perf_counter()
+        result = self.optimizer.optimize(content)
+        saved = len(content) - len(result)
+        self.metrics.emit(Event("optimize", href, time.perf_counter() - start, saved, page=self.page.prefix))
+        return result
+
+    def embed(self, content: bytes) -> str:
+        return embed(content, self.write, self.assets, self.cache)
+
+    def fetch_img(self, href: str) -> tuple[bytes, str | None]:
+        return self.fetcher.fetch(href)
+
+
+@dataclass
+class ImageFetcher:
+    session: requests.Session = field(default_factory=create_session)
+    cache: ImageCache | None = None
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    timeout: AdaptiveTimeout = field(default_factory=AdaptiveTimeout)
+    metrics: Metrics = field(default_factory=Metrics)
+    page: str | None = None
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.retries = 0
+
+    def get(self, href: str, headers: dict[str, str] | None = None, size: int | None = None) -> requests.Response:
+        for attempt in range(self.retry.attempts):
+            last = attempt + 1 == self.retry.attempts
+            start = time.perf_counter()
+            try:
+                response = self.session.get(href, headers=headers, timeout=self.timeout.timeout(attempt, size))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last:
+                    raise
+                error = repr(e)
             else:
-                raise ValueError("Unknown image format")
+                if response.status_code not in RETRY_STATUS or last:
+                    seconds = time.perf_counter() - start
+                    self.timeout.observe(response.elapsed.total_seconds(), seconds, len(response.content))
+                    return response
+                error = f"HTTP {response.status_code}"
+            with self.lock:
+                self.retries += 1
+            seconds = time.perf_counter() - start
+            self.metrics.emit(Event("image", href, seconds, status="retry", error=error, page=self.page))
+            time.sleep(self.retry.delay(attempt))
 
-            return image
-        except:
-            return
+    def fetch(self, href: str) -> tuple[bytes, str | None]:
+        if self.cache is None:
+            response = self.get(href)
+            response.raise_for_status()
+            return response.content, None
+
+        with self.cache.guard(href):
+            return self.revalidate(href)
+
+    def revalidate(self, href: str) -> tuple[bytes, str | None]:
+        entry = self.cache.get(href)
+        if entry is not None and self.cache.fresh(entry):
+            content = self.cache.read(href)
+            if content is not None:
+                return content, "hit"
+
+        size = entry.size if entry is not None else None
+        response = self.get(href, self.cache.headers(entry), size)
+        if response.status_code == 304:
+            content = self.cache.read(href)
+            if content is not None:
+                self.cache.refresh(href, response.headers)
+                return content, "revalidated"
+            response = self.get(href, size=size)
+        response.raise_for_status()
+        self.cache.put(href, response.content, response.headers)
+        return response.content, "miss"
 
 
 html_template = """<!DOCTYPE html><html lang="ja"><head><meta charset="UTF-8"><meta http-equiv="X-UA-Compatible" content="IE=edge"><meta name="viewport" content="width=device-width,initial-scale=1"><title></title></head><style>header,header>div{align-items:center}header>div,nav{gap:10px;display:flex}#page-num>input,body,header button,html,nav>button{color:var(--color-primary)}body,html,main{background-color:var(--color-main)}main,nav{padding:30px 0;height:calc(100vh - 50px);overflow-y:auto}header,header button,header>div,nav{display:flex}*,::after,::before{box-sizing:border-box;margin:0}:root.dark{color-scheme:dark;--color-header:#3b3b3b;--color-main:#333333;--color-sidebar:#4a4a4a;--color-primary:white;--color-accent:#5fb8e4}:root.light{color-scheme:light;--color-header:#f7f7f7;--color-main:#dfdfdf;--color-sidebar:#eeeeee;--color-primary:black;--color-accent:#5fb8e4}body,html{height:100vh;width:100%;line-height:1.5}button,input{background-color:transparent;border:none;outline:0;padding:0;appearance:none;font:inherit}button{cursor:pointer}.grid{display:grid;grid-template-columns:max(250px,min(20%,350px)) 1fr;grid-template-rows:50px 1fr;min-height:100vh}.grid.hide{grid-template-columns:0 1fr}header{background-color:var(--color-header);grid-column:1/3;justify-content:space-between;padding:0 25px}header>div{height:35px}header button{align-items:center;justify-content:center;border-radius:5px;height:100%;width:35px}#sidebar,header button.active,header button:hover{background-color:var(--color-sidebar)}#page-num{height:100%}#page-num>input{width:50px;border:1px solid #6a6a6b;border-radius:5px;height:100%;text-align:right;padding:0 10px}#slide-container>section,.preview{width:100%}#page-num>span::before{content:"/ ";margin-left:5px}nav{flex-direction:column;align-items:center;overflow-x:hidden}nav>button{width:75%;font-size:14px;opacity:.7}.preview{box-sizing:content-box;line-height:0;position:relative;margin-bottom:8px;filter:drop-shadow(0 0 5px rgba(0, 0, 0, .2));border:5px solid transparent}nav>button.active{opacity:1}nav>button.active>.preview{border:solid 5px var(--color-accent)}main{flex-grow:1;overflow-x:auto}#slide-container{display:flex;flex-direction:column;align-items:center;gap:30px;margin:0 auto}</style><body><div class="grid"><header><div id="contents-control"><button type="button" class="active" id="toggle-contents" aria-label="目次"><svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-align-justified" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round"><path stroke="none" d="M0 0h24v24H0z" fill="none"></path><path d="M4 6l16 0m-16 6l16 0m-16 6l12 0"></path></svg></button><div id="page-num"><input type="text" value="1"><span></span></div></div><div id="zoom"><button type="button" id="zoom-out" aria-label="ズームアウト"><svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-minus" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round"><path stroke="none" d="M0 0h24v24H0z" fill="none"></path><path d="M5 12l14 0"></path></svg></button><button type="button" id="zoom-in" aria-label="ズームイン"><svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-plus" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round"><path stroke="none" d="M0 0h24v24H0z" fill="none"></path><path d="M12 5l0 14m-7 -7l14 0"></path></svg></button><button type="button" id="fill" aria-label="画面幅に合わせる"><svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-arrow-autofit-width" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round"><path stroke="none" d="M0 0h24v24H0z" fill="none"></path><path d="M4 12v-6a2 2 0 0 1 2 -2h12a2 2 0 0 1 2 2v6m-10 6h-7m18 0h-7m-8 -3l-3 3l3 3m12 -6l3 3l-3 3"></path></svg></button></div><div id="other"><button type="button" id="dark-mode" aria-label="ダークモード"><svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-moon" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round"><path stroke="none" d="M0 0h24v24H0z" fill="none"></path><path d="M12 3c.132 0 .263 0 .393 0a7.5 7.5 0 0 0 7.92 12.446a9 9 0 1 1 -8.313 -12.454z"></path></svg></button><button type="button" id="light-mode" aria-label="ライトモード"><svg xmlns="http://www.w3.org/2000/svg" class="icon icon-tabler icon-tabler-moon-off" width="24" height="24" viewBox="0 0 24 24" stroke-width="2" stroke="currentColor" fill="none" stroke-linecap="round" stroke-linejoin="round"><path stroke="none" d="M0 0h24v24H0z" fill="none"></path><path d="M7.962 3.949a8.97 8.97 0 0 1 4.038 -.957v.008h.393a7.478 7.478 0 0 0 -2.07 3.308m-.141 3.84c.186 .823 .514 1.626 .989 2.373a7.49 7.49 0 0 0 4.586 3.268m3.893 -.11c.223 -.067 .444 -.144 .663 -.233a9.088 9.088 0 0 1 -.274 .597m-1.695 2.337a9 9 0 0 1 -12.71 -12.749m-2.634 -2.631l18 18"></path></svg></button></div></header><div id="sidebar"><nav id="contents"></nav></div><main><div id="slide-container"></div></main></div></body><script>const toggleContentsButton=document.querySelector("#toggle-contents"),gridContainer=document.querySelector(".grid");toggleContentsButton.addEventListener("click",()=>{toggleContentsButton.classList.toggle("active"),gridContainer.classList.toggle("hide")});const offset=30,scrollNav=e=>{let t=document.querySelector("nav"),o=t.getBoundingClientRect(),l=e.getBoundingClientRect();l.top<o.top?t.scrollBy({top:l.top-o.top-30,behavior:"instant"}):l.bottom>o.bottom&&t.scrollBy({top:l.bottom-o.bottom+30,behavior:"instant"})},main=document.querySelector("main"),mainRect=main.getBoundingClientRect(),slides=document.querySelectorAll("main > div > section"),nav=document.querySelector("nav"),pageInput=document.querySelector("#page-num > input"),pageSpan=document.querySelector("#page-num > span");pageSpan.textContent=slides.length;let prevPage=1;for(let i=0;i<slides.length;i++){let e=slides[i],t=document.createElement("button"),o=e.cloneNode(!0);o.classList.add("preview"),t.setAttribute("type","button"),t.setAttribute("aria-label",`${i+1}ページ目`),t.appendChild(o),t.appendChild(document.createTextNode(`${i+1}`)),t.addEventListener("click",()=>{let o=e.getBoundingClientRect();main.scrollBy({top:o.top-mainRect.top-mainRect.height/2+o.height/2,behavior:"instant"}),prevPage=i+1,pageInput.value=i+1,scrollNav(t)}),nav.appendChild(t)}const navChildren=nav.querySelectorAll("button"),options={root:null,rootMargin:"-50% 0px",threshold:0},observer=new IntersectionObserver(e=>{e.forEach(e=>{if(!e.isIntersecting)return;let t=Array.from(slides).indexOf(e.target);navChildren.forEach(e=>e.classList.remove("active")),navChildren[t].classList.add("active"),prevPage=t+1,pageInput.value=t+1,scrollNav(navChildren[t])})},options);slides.forEach(e=>{observer.observe(e)}),pageInput.addEventListener("keydown",e=>{if("Enter"!==e.key)return;let t=parseInt(pageInput.value,10);if(isNaN(t)){pageInput.value=prevPage;return}t<1&&(t=1),t>slides.length&&(t=slides.length),navChildren[t-1].click()}),pageInput.addEventListener("change",()=>{pageInput.value=prevPage});const darkModeButton=document.querySelector("#dark-mode"),lightModeButton=document.querySelector("#light-mode"),isDarkMode=window.matchMedia("(prefers-color-scheme: dark)").matches,switchMode=e=>{"dark"===e?(document.documentElement.classList.remove("light"),document.documentElement.classList.add("dark"),darkModeButton.style.display="none",lightModeButton.style.display="flex"):(document.documentElement.classList.remove("dark"),document.documentElement.classList.add("light"),darkModeButton.style.display="flex",lightModeButton.style.display="none")};isDarkMode?switchMode("dark"):switchMode("light"),darkModeButton.addEventListener("click",()=>{switchMode("dark")}),lightModeButton.addEventListener("click",()=>{switchMode("light")});const slideContainer=document.querySelector("#slide-container"),zoomInButton=document.querySelector("#zoom-in"),zoomOutButton=document.querySelector("#zoom-out"),fillButton=document.querySelector("#fill"),defaultWidth=.9*mainRect.width;let scale=1,isFillMode=!1;const zoom=e=>{slideContainer.style.width=`${defaultWidth*e}px`};zoom(scale),zoomInButton.addEventListener("click",()=>{isFillMode?(isFillMode=!1,zoom(scale),fillButton.classList.remove("active")):((scale+=.1)>2&&(scale=2),zoom(scale))}),zoomOutButton.addEventListener("click",()=>{isFillMode?(isFillMode=!1,zoom(scale),fillButton.classList.remove("active")):((scale-=.1)<.1&&(scale=.1),zoom(scale))}),fillButton.addEventListener("click",()=>{isFillMode?zoom(scale):slideContainer.style.width="100%",isFillMode=!isFillMode,fillButton.classList.toggle("active")});</script></html>"""
+
+template = str(BeautifulSoup(html_template, "html.parser")).encode("utf-8")
+template_head, template_rest = template.split(b"<title></title>")
+template_body, template_tail = template_rest.split(b'<div id="slide-container"></div>')
+template_head += b"<title>"
+template_body = b"</title>" + template_body + b'<div id="slide-container">'
+template_tail = b"</div>" + template_tail
@@ -0,0 +1,103 @@
+import argparse
+import html
+import mimetypes
+import os
+import sys
+import webbrowser
+import zipfile
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+from archive import compact
+
+
+class Handler(SimpleHTTPRequestHandler):
+    def do_GET(self) -> None:
+        path = unquote(self.path.split("?", 1)[0]).lstrip("/")
+        if path == "":
+            self.send(self.index().encode("utf-8"), "text/html; charset=utf-8")
+            return
+        course, _, name = path.partition("/")
+        archive = os.path.join(self.directory, f"{course}.zip")
+        if name and os.path.isfile(archive):
+            with zipfile.ZipFile(archive) as zf:
+                try:
+                    content = zf.read(name)
+                except KeyError:
+                    self.send_error(404)
+                    return
+            self.send(content, mimetypes.guess_type(name)[0] or "application/octet-stream")
+            return
+        super().do_GET()
+
+    def send(self, content: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def index(self) -> str:
+        items = []
+        for course, names in pages(self.directory).items():
+            for name in names:
+                url = quote(f"/{course}/{name}")
+                items.append(f'<li><a href="{url}">{html.escape(course)} / {html.escape(name)}</a></li>')
+        return f"<!DOCTYPE html><html><meta charset='utf-8'><body><ul>{''.join(items)}</ul></body></html>"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def pages(root: str) -> dict[str, list[str]]:
+    result = {}
+    for file in sorted(os.listdir(root)):
+        if file.endswith(".zip"):
+            with zipfile.ZipFile(os.path.join(root, file)) as zf:
+                result[file[: -len(".zip")]] = sorted({name for name in zf.namelist() if name.endswith(".html")})
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Browse course archives written by the zip output")
+    parser.add_argument("root", help="output directory containing <course>.zip archives")
+    parser.add_argument("--list", action="store_true", help="list the pages in every archive")
+    parser.add_argument("--extract", nargs=2, metavar=("COURSE", "PAGE"), help="extract a single page")
+    parser.add_argument("--to", default=".", help="directory to extract into")
+    parser.add_argument("--compact", action="store_true", help="drop superseded entries from every archive")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--open", nargs=2, metavar=("COURSE", "PAGE"), help="serve and open a single page")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for course, names in pages(args.root).items():
+            for name in names:
+                print(f"{course}\t{name}")
+        return 0
+    if args.extract:
+        course, name = args.extract
+        with zipfile.ZipFile(os.path.join(args.root, f"{course}.zip")) as zf:
+            print(zf.extract(name, args.to))
+        return 0
+    if args.compact:
+        for course in pages(args.root):
+            removed = compact(os.path.join(args.root, f"{course}.zip"))
+            print(f"{course}: removed {removed} superseded entries")
+        return 0
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), partial(Handler, directory=args.root))
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    if args.open:
+        url += quote("/".join(args.open))
+    print(f"Serving {args.root} at {url}", flush=True)
+    webbrowser.open(url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())